@@ -1,13 +1,21 @@
 from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.exceptions import NotFound
 import pandas as pd
 import numpy as np
 import re
-import unidecode
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from io import BytesIO
+import json
 import os
 import logging
-import uuid 
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
 import sys # Adicionado para sys._MEIPASS e sys.frozen
 
 # --- Configuração Inicial do Flask e Caminhos Estáticos ---
@@ -26,7 +34,91 @@ STATIC_FOLDER_PATH = os.path.join(BASE_DIR_FOR_STATIC, 'frontend_build') # Esper
 app = Flask(__name__, static_folder=STATIC_FOLDER_PATH, static_url_path='')
 CORS(app, resources={r"/api/*": {"origins": "*"}}) # Aplica CORS apenas às rotas de API
 
+# Resultados processados são persistidos em disco como Feather (Arrow IPC);
+# o dicionário guarda apenas task_id -> caminho do arquivo, liberando a RAM
+# entre o /api/analyze e o download.
+TASKS_DIR = os.path.join(tempfile.gettempdir(), 'paf_tasks')
+os.makedirs(TASKS_DIR, exist_ok=True)
+TASK_TTL_SECONDS = 30 * 60
+
 app.processed_tasks = {}
+# Workers gthread do gunicorn compartilham o processo: protege o dicionário
+# de tarefas entre threads (entre processos, o arquivo em disco é a fonte
+# de verdade).
+_tasks_lock = threading.Lock()
+
+
+def _cleanup_stale_tasks():
+    while True:
+        time.sleep(60)
+        cutoff = time.time() - TASK_TTL_SECONDS
+        try:
+            for fname in os.listdir(TASKS_DIR):
+                fpath = os.path.join(TASKS_DIR, fname)
+                try:
+                    if os.path.getmtime(fpath) < cutoff:
+                        os.remove(fpath)
+                except OSError:
+                    pass
+            for tid, stored in list(app.processed_tasks.items()):
+                if isinstance(stored, str) and not os.path.exists(stored):
+                    app.processed_tasks.pop(tid, None)
+        except OSError:
+            pass
+
+
+threading.Thread(target=_cleanup_stale_tasks, daemon=True).start()
+
+# python-calamine (Rust) lê .xlsx ~10x mais rápido que o openpyxl (XML puro
+# em Python); usado quando instalado, com fallback para o engine original.
+try:
+    import python_calamine  # noqa: F401
+    _XLSX_ENGINE = 'calamine'
+except ImportError:
+    _XLSX_ENGINE = 'openpyxl'
+
+# xxhash (opcional): reduz cada endereço normalizado a um uint64 antes do
+# agrupamento; hashear inteiros de 8 bytes é bem mais barato do que strings.
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# pyarrow (opcional): kernels de string vetorizados em C++ para a
+# normalização, sem nenhuma chamada Python por valor.
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import feather as pa_feather
+except ImportError:
+    pa = None
+    pc = None
+
+# numba (opcional): JIT do normalizador em lote quando o pyarrow não está
+# disponível; caminho nativo sem dispatch do interpretador por caractere.
+try:
+    from numba import njit as _njit
+    from numba import typed as _numba_typed
+    from numba.core import types as _numba_types
+except ImportError:
+    _njit = None
+
+# orjson (opcional): serializa o JSON da resposta (preview com até 200
+# registros) em C, várias vezes mais rápido que o json da stdlib.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    class ORJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = ORJSONProvider(app)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 
@@ -64,25 +156,300 @@ OUTPUT_FIELD_ORDER = [
     'Cliente', 'Tipo de Pessoa', 'CPF/CNPJ'
 ]
 
+ADDRESS_FIELDS = ['Logradouro', 'Número', 'Complemento', 'Bairro', 'Cidade', 'UF', 'CEP']
+
+# Abreviações de endereço: uma única regex com alternação compilada no import,
+# com o texto casado resolvido via dicionário (uma passada em vez de nove).
+_ABBREV_MAP = {
+    'rua': 'r', 'r.': 'r',
+    'avenida': 'av', 'av.': 'av',
+    'numero': 'n', 'n°': 'n', 'n.': 'n',
+    'apartamento': 'ap', 'apto': 'ap', 'ap.': 'ap',
+    'lote': 'lt', 'quadra': 'qd', 'bloco': 'bl', 'casa': 'cs', 'sao': 's',
+}
+def _build_abbrev_re() -> re.Pattern:
+    # Alternação única derivada do _ABBREV_MAP (tokens maiores primeiro, para
+    # 'numero' ganhar de 'n.'); tokens terminados em '.' não levam \b final,
+    # como nos padrões originais.
+    parts = []
+    for token in sorted(_ABBREV_MAP, key=len, reverse=True):
+        parts.append(r'\b' + re.escape(token) + ('' if token.endswith('.') else r'\b'))
+    return re.compile('|'.join(parts))
+
+
+_ABBREV_RE = _build_abbrev_re()
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_WS_RE = re.compile(r'\s+')
+
+# Substituições na ordem original, para o caminho Arrow/RE2 (que não aceita
+# função de replacement, só padrão + texto fixo).
+_ABBREV_SUBS = [
+    (r'\brua\b|\br\.', 'r'),
+    (r'\bavenida\b|\bav\.', 'av'),
+    (r'\bnumero\b|\bn°\b|\bn\.', 'n'),
+    (r'\bapartamento\b|\bapto\b|\bap\.', 'ap'),
+    (r'\blote\b', 'lt'),
+    (r'\bquadra\b', 'qd'),
+    (r'\bbloco\b', 'bl'),
+    (r'\bcasa\b', 'cs'),
+    (r'\bsao\b', 's'),
+]
+
+
+# Tabela de remoção de acentos para o conjunto que aparece em endereços
+# brasileiros (aplicada depois do lower(), só minúsculas); inclui os
+# ordinais º/ª, frequentes em 'Nº'.
+_ACCENT_SRC = 'áàâãäéèêëíìîïóòôõöúùûüçñºª'
+_ACCENT_DST = 'aaaaaeeeeiiiiooooouuuucnoa'
+_ACCENT_TABLE = str.maketrans(_ACCENT_SRC, _ACCENT_DST)
+
+if _njit is not None:
+    _NB_FOLD = _numba_typed.Dict.empty(_numba_types.unicode_type, _numba_types.unicode_type)
+    for _src_ch, _dst_ch in zip(_ACCENT_SRC, _ACCENT_DST):
+        _NB_FOLD[_src_ch] = _dst_ch
+    _NB_TOKENS = _numba_typed.Dict.empty(_numba_types.unicode_type, _numba_types.unicode_type)
+    for _tok, _abbr in _ABBREV_MAP.items():
+        _NB_TOKENS[_tok] = _abbr
+
+    @_njit(cache=True)
+    def _normalize_batch_jit(values, fold_table, token_map):
+        # Uma única varredura por string: minúsculas + remoção de acento por
+        # caractere e substituição de abreviações via dict. Pontuação age
+        # como fronteira de sub-token (o \b do _ABBREV_RE): cada run de \w é
+        # mapeado individualmente e os runs são reconcatenados sem separador,
+        # como o _PUNCT_RE faria ('quadra-5' -> 'qd5', '01000-000' ->
+        # '01000000'); só espaço em branco separa tokens na saída.
+        results = _numba_typed.List.empty_list(_numba_types.unicode_type)
+        for s in values:
+            s = s.lower()
+            parts = _numba_typed.List.empty_list(_numba_types.unicode_type)
+            token = ''
+            run = ''
+            for ch in s:
+                if ch in fold_table:
+                    ch = fold_table[ch]
+                if ch.isalnum() or ch == '_':
+                    run += ch
+                else:
+                    if run != '':
+                        if run in token_map:
+                            token += token_map[run]
+                        else:
+                            token += run
+                        run = ''
+                    if ch == ' ' or ch == '\t' or ch == '\n' or ch == '\r':
+                        if token != '':
+                            parts.append(token)
+                            token = ''
+            if run != '':
+                if run in token_map:
+                    token += token_map[run]
+                else:
+                    token += run
+            if token != '':
+                parts.append(token)
+            results.append(' '.join(parts))
+        return results
+
+    def _normalize_uniques_numba(uniques) -> list:
+        if len(uniques) == 0:
+            return []
+        values = _numba_typed.List([str(v) for v in uniques])
+        return list(_normalize_batch_jit(values, _NB_FOLD, _NB_TOKENS))
+
+    @_njit(cache=True)
+    def _counting_sort_codes(codes, n_codes):
+        # Counting sort O(n + k) estável sobre os códigos do factorize:
+        # devolve a permutação que agrupa linhas do mesmo código e os
+        # offsets de início/fim de cada grupo.
+        counts = np.zeros(n_codes + 1, dtype=np.int64)
+        for c in codes:
+            counts[c + 1] += 1
+        offsets = np.cumsum(counts)
+        cursor = offsets[:-1].copy()
+        order = np.empty(len(codes), dtype=np.int64)
+        for i in range(len(codes)):
+            c = codes[i]
+            order[cursor[c]] = i
+            cursor[c] += 1
+        return order, offsets
+
+
+def _normalize_uniques_arrow(uniques) -> list:
+    arr = pa.array(uniques, type=pa.string())
+    arr = pc.utf8_lower(arr)
+    # NFKD + remoção de marcas combinantes equivale ao unidecode para o
+    # conjunto de caracteres acentuados presente em endereços brasileiros.
+    arr = pc.utf8_normalize(arr, form='NFKD')
+    arr = pc.replace_substring_regex(arr, pattern=r'\p{Mn}', replacement='')
+    for pattern, repl in _ABBREV_SUBS:
+        arr = pc.replace_substring_regex(arr, pattern=pattern, replacement=repl)
+    arr = pc.replace_substring_regex(arr, pattern=r'[^\w\s]', replacement='')
+    arr = pc.utf8_trim_whitespace(arr)
+    arr = pc.replace_substring_regex(arr, pattern=r'\s+', replacement=' ')
+    return arr.to_pylist()
+
+
+def _abbrev_repl(match: re.Match) -> str:
+    return _ABBREV_MAP[match.group(0)]
+
+
+# A normalização é paralelizável por valor; acima deste número de valores
+# únicos o fallback Python divide os lotes entre processos (o regex
+# segura o GIL, então threads não ajudam). Pool criado sob demanda e
+# reaproveitado entre requisições.
+_PARALLEL_MIN_UNIQUES = 50000
+_POOL_WORKERS = os.cpu_count() or 1
+_normalize_pool = None
+
+
+def _normalize_values_chunk(values) -> list:
+    return [normalize_address_val(v) for v in values]
+
+
+def _normalize_uniques_parallel(uniques) -> list:
+    global _normalize_pool
+    if _normalize_pool is None:
+        _normalize_pool = ProcessPoolExecutor(max_workers=_POOL_WORKERS)
+    results = []
+    for chunk_result in _normalize_pool.map(_normalize_values_chunk, np.array_split(uniques, _POOL_WORKERS)):
+        results.extend(chunk_result)
+    return results
+
+
+def _normalize_address_series(s: pd.Series) -> pd.Series:
+    # Colunas de endereço repetem muito (UF, cidade, CEP...): normalizar só os
+    # valores únicos e mapear de volta reduz as chamadas de N linhas para N únicos.
+    s = s.fillna('')
+    uniques = s.unique()
+    if pc is not None:
+        lookup = dict(zip(uniques, _normalize_uniques_arrow(uniques)))
+    elif _njit is not None:
+        lookup = dict(zip(uniques, _normalize_uniques_numba(uniques)))
+    elif len(uniques) >= _PARALLEL_MIN_UNIQUES and _POOL_WORKERS > 1:
+        lookup = dict(zip(uniques, _normalize_uniques_parallel(uniques)))
+    else:
+        # Fallback puro-pandas: a mesma cadeia de regex do caminho Arrow,
+        # encadeada via .str sobre os únicos (laço na camada C do pandas).
+        norm = pd.Series(uniques).astype(str).str.lower().str.translate(_ACCENT_TABLE)
+        norm = norm.str.replace(_ABBREV_RE, _abbrev_repl, regex=True)
+        norm = norm.str.replace(_PUNCT_RE, '', regex=True).str.strip()
+        norm = norm.str.replace(_WS_RE, ' ', regex=True)
+        lookup = dict(zip(uniques, norm))
+    return s.map(lookup)
+
+
+def build_normalized_address_series(df: pd.DataFrame, address_cols: list) -> pd.Series:
+    parts = []
+    for actual_col_name in address_cols:
+        if actual_col_name in df.columns:
+            parts.append(_normalize_address_series(df[actual_col_name]))
+
+    if not parts:
+        return pd.Series('', index=df.index)
+
+    if len(parts) == 1:
+        combined = parts[0]
+    else:
+        combined = parts[0].str.cat(parts[1:], sep=' ', na_rep='')
+    return combined.str.replace(_WS_RE, ' ', regex=True).str.strip()
+
+
 def normalize_address_val(value: any) -> str:
     if value is None or value == '' or (isinstance(value, float) and np.isnan(value)):
         return ''
-    s = str(value).lower()
-    s = unidecode.unidecode(s)
-    s = re.sub(r'\brua\b|\br\.', 'r', s)
-    s = re.sub(r'\bavenida\b|\bav\.', 'av', s)
-    s = re.sub(r'\bnumero\b|\bn°\b|\bn\.', 'n', s)
-    s = re.sub(r'\bapartamento\b|\bapto\b|\bap\.', 'ap', s)
-    s = re.sub(r'\blote\b', 'lt', s)
-    s = re.sub(r'\bquadra\b', 'qd', s)
-    s = re.sub(r'\bbloco\b', 'bl', s)
-    s = re.sub(r'\bcasa\b', 'cs', s)
-    s = re.sub(r'\bsao\b', 's', s)
-    s = re.sub(r'[^\w\s]', '', s).strip()
-    s = re.sub(r'\s+', ' ', s)
-    return s
+    # str.translate roda em C numa única passada, sem o lookup por caractere
+    # em Python do unidecode.
+    s = str(value).lower().translate(_ACCENT_TABLE)
+    # Tokeniza uma vez e troca abreviações por lookup em dict, sem regex:
+    # em strings curtas o setup da máquina de estados domina o custo.
+    # Pontuação delimita sub-tokens como o \b do _ABBREV_RE, e os runs são
+    # reconcatenados sem separador como no _PUNCT_RE ('quadra-5' -> 'qd5');
+    # mesma semântica do tokenizador numba e dos caminhos regex/Arrow.
+    parts = []
+    for raw in s.split():
+        token = ''
+        run = []
+        for ch in raw:
+            if ch.isalnum() or ch == '_':
+                run.append(ch)
+            elif run:
+                r = ''.join(run)
+                token += _ABBREV_MAP.get(r, r)
+                run = []
+        if run:
+            r = ''.join(run)
+            token += _ABBREV_MAP.get(r, r)
+        if token:
+            parts.append(token)
+    return ' '.join(parts)
+
+# Partes fixas do pacote OOXML mínimo escrito por fast_to_xlsx (planilha de
+# dados puros, sem estilos nem strings compartilhadas).
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>')
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>')
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>')
+_XML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+# Caracteres de controle são ilegais em XML 1.0 (só \t \n \r passam): escapa
+# como _xHHHH_, a mesma convenção do xlsxwriter/openpyxl, que os leitores de
+# .xlsx decodificam de volta ao abrir o arquivo.
+for _cp in (*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20)):
+    _XML_ESCAPE[_cp] = f'_x{_cp:04X}_'
+
+
+def fast_to_xlsx(df: pd.DataFrame, stream, sheet_name: str):
+    # Emite o XML do xlsx diretamente (células inlineStr) e empacota com
+    # zipfile, dispensando o custo por célula das bibliotecas de Excel —
+    # a saída não tem formatação alguma, só dados.
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _XLSX_ROOT_RELS)
+        zf.writestr('xl/workbook.xml', _XLSX_WORKBOOK.format(sheet_name=str(sheet_name).translate(_XML_ESCAPE)))
+        zf.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS)
+        with zf.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        b'<sheetData>')
+            sheet.write(_xlsx_row(df.columns))
+            for row in df.itertuples(index=False, name=None):
+                sheet.write(_xlsx_row(row))
+            sheet.write(b'</sheetData></worksheet>')
+
+
+def _xlsx_row(values) -> bytes:
+    cells = ''.join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{str(v).translate(_XML_ESCAPE)}</t></is></c>'
+        for v in values)
+    return f'<row>{cells}</row>'.encode('utf-8')
+
 
 def get_col_mappings_from_df(df_columns: list) -> dict:
+    # Memoizado por tupla de colunas: analyze e download do mesmo arquivo
+    # resolvem o mapeamento uma única vez (cópia para ninguém mutar o cache).
+    return dict(_get_col_mappings_cached(tuple(df_columns)))
+
+
+@lru_cache(maxsize=32)
+def _get_col_mappings_cached(df_columns: tuple) -> dict:
     mappings = {}
     df_cols_lower_stripped = {str(col).lower().replace(" ", ""): str(col) for col in df_columns}
     
@@ -104,15 +471,16 @@ def get_col_mappings_from_df(df_columns: list) -> dict:
             mappings[standard_key] = found_col
     return mappings
 
-def concatenate_address_for_row(row: pd.Series, col_mappings: dict) -> str:
+def concatenate_address_for_row(row: pd.Series, mapped_cols: list) -> str:
+    # Fallback escalar; o caminho quente usa build_normalized_address_series.
+    # Recebe a lista de colunas já resolvida (ver core_processing...), em vez
+    # de refazer os lookups em col_mappings a cada linha.
     components = []
-    address_fields = ['Logradouro', 'Número', 'Complemento', 'Bairro', 'Cidade', 'UF', 'CEP']
-    for field_key in address_fields:
-        actual_col_name = col_mappings.get(field_key)
-        if actual_col_name and actual_col_name in row and pd.notna(row[actual_col_name]):
+    for actual_col_name in mapped_cols:
+        if pd.notna(row[actual_col_name]):
             val = normalize_address_val(row[actual_col_name])
-            if val: 
-                 components.append(val)
+            if val:
+                components.append(val)
     return ' '.join(components)
 
 def core_processing_logic_and_prepare_output(df: pd.DataFrame) -> dict:
@@ -127,12 +495,15 @@ def core_processing_logic_and_prepare_output(df: pd.DataFrame) -> dict:
         raise ValueError(f"Colunas essenciais não encontradas ou não mapeadas corretamente: {', '.join(missing_mapped_cols)}. Verifique se o arquivo contém colunas como: {missing_cols_examples}")
 
     app.logger.info("Normalizando e concatenando endereços...")
-    df['enderecoNormalizado'] = df.apply(lambda row: concatenate_address_for_row(row, col_mappings), axis=1)
+    address_cols = [col_mappings[k] for k in ADDRESS_FIELDS if k in col_mappings]
+    df['enderecoNormalizado'] = build_normalized_address_series(df, address_cols)
     
     df_original_indexed = df 
     df_original_indexed['original_index_col'] = df_original_indexed.index 
 
-    df_filtered = df_original_indexed[df_original_indexed['enderecoNormalizado'] != ''].copy() 
+    # Sem .copy(): df_filtered é só lido daqui em diante (hash, máscara de
+    # duplicatas e fatias), então a view do boolean indexing basta.
+    df_filtered = df_original_indexed[df_original_indexed['enderecoNormalizado'] != '']
     num_rows_valid = len(df_filtered)
 
     if num_rows_valid == 0:
@@ -143,81 +514,138 @@ def core_processing_logic_and_prepare_output(df: pd.DataFrame) -> dict:
         }
 
     app.logger.info(f"Encontrando duplicatas exatas para {num_rows_valid} endereços válidos...")
-    address_counts = df_filtered['enderecoNormalizado'].value_counts()
-    duplicated_address_strings = address_counts[address_counts > 1].index.tolist()
+    if xxhash is not None:
+        group_keys = pd.Series(
+            np.fromiter(
+                (xxhash.xxh3_64_intdigest(s.encode('utf-8')) for s in df_filtered['enderecoNormalizado'].to_numpy()),
+                dtype=np.uint64, count=num_rows_valid),
+            index=df_filtered.index)
+    else:
+        group_keys = df_filtered['enderecoNormalizado']
+
+    # duplicated(keep=False) marca todas as linhas duplicadas numa única
+    # passada de hash, sem o value_counts + isin sobre a coluna inteira.
+    dup_mask = group_keys.duplicated(keep=False)
 
     groups_indices_list = []
-    if duplicated_address_strings:
-        app.logger.info(f"Encontradas {len(duplicated_address_strings)} strings de endereço únicas que são duplicadas.")
+    if dup_mask.any():
+        df_only_duplicates = df_filtered.loc[dup_mask]
+        app.logger.info(f"Encontradas {group_keys.loc[dup_mask].nunique()} strings de endereço únicas que são duplicadas.")
         app.logger.info("Iniciando coleta otimizada de índices para grupos duplicados...")
-        
-        df_only_duplicates = df_filtered[df_filtered['enderecoNormalizado'].isin(duplicated_address_strings)]
-        
-        grouped_indices_series = df_only_duplicates.groupby('enderecoNormalizado')['original_index_col'].apply(list)
-        
-        for indices_list_for_group in grouped_indices_series:
-            if len(indices_list_for_group) > 1:
-                groups_indices_list.append(sorted(indices_list_for_group)) 
-        
+
+        # Agrupamento por códigos inteiros do factorize, sem o custo do
+        # apply(list) genérico do groupby.
+        codes, uniques_codes = pd.factorize(group_keys.loc[dup_mask].values, sort=False)
+        if _njit is not None:
+            # Counting sort O(n + k): os códigos são densos em [0, k), então
+            # dá para agrupar sem a comparação O(n log n) do argsort.
+            order, offsets = _counting_sort_codes(codes.astype(np.int64), len(uniques_codes))
+            sorted_indices = df_only_duplicates['original_index_col'].values[order]
+            for g in range(len(uniques_codes)):
+                group_indices = sorted_indices[offsets[g]:offsets[g + 1]]
+                if len(group_indices) > 1:
+                    groups_indices_list.append(sorted(group_indices.tolist()))
+        else:
+            order = np.argsort(codes, kind='stable')
+            sorted_indices = df_only_duplicates['original_index_col'].values[order]
+            boundaries = np.diff(codes[order]).nonzero()[0] + 1
+            for group_indices in np.split(sorted_indices, boundaries):
+                if len(group_indices) > 1:
+                    groups_indices_list.append(sorted(group_indices.tolist()))
+
         app.logger.info("Coleta otimizada de índices concluída.")
     else:
         app.logger.info("Nenhuma duplicata exata encontrada.")
     
     app.logger.info(f"Total de grupos de duplicatas exatas formados: {len(groups_indices_list)}")
     
-    df_original_indexed['groupColor'] = pd.NA 
+    # Cores como Categorical: códigos int8 escritos num array pré-alocado
+    # com uma única escrita vetorizada (-1 vira NaN), sem laço por grupo.
+    color_codes = np.full(len(df_original_indexed), -1, dtype=np.int8)
+    grouped_positions = None
     if groups_indices_list:
         app.logger.info(f"Atribuindo cores a {len(groups_indices_list)} grupos...")
-        for i, group_of_original_indices in enumerate(groups_indices_list):
-            color = GROUP_COLORS[i % len(GROUP_COLORS)]
-            df_original_indexed.loc[group_of_original_indices, 'groupColor'] = color
+        group_lengths = [len(group) for group in groups_indices_list]
+        flat_group_indices = np.fromiter(
+            (idx for group in groups_indices_list for idx in group),
+            dtype=np.int64, count=sum(group_lengths))
+        flat_codes = (np.arange(len(groups_indices_list), dtype=np.int64) % len(GROUP_COLORS)).astype(np.int8)
+        grouped_positions = df_original_indexed.index.get_indexer(flat_group_indices)
+        color_codes[grouped_positions] = np.repeat(flat_codes, group_lengths)
         app.logger.info("Atribuição de cores concluída.")
-        
-    df_all_data_with_colors = df_original_indexed.replace({pd.NA: None, np.nan: None})
+    df_original_indexed['groupColor'] = pd.Categorical.from_codes(color_codes, categories=GROUP_COLORS)
+
+
+    # Sem o replace({NA: None}) de quadro inteiro: só o preview (200 linhas)
+    # precisa de None para o JSON; o restante segue com NaN/NA nativos.
+    df_all_data_with_colors = df_original_indexed
 
     app.logger.info("Preparando DataFrame agrupado e ordenado para resultado (df_grouped_ordered)...")
     df_grouped_ordered = pd.DataFrame() 
     if groups_indices_list:
         app.logger.info("Coletando linhas para df_grouped_ordered...")
-        temp_rows_list = []
-        for group_of_original_indices in groups_indices_list:
-            for original_idx in group_of_original_indices:
-                temp_rows_list.append(df_all_data_with_colors.loc[original_idx])
-        
-        if temp_rows_list:
-            df_grouped_ordered = pd.DataFrame(temp_rows_list)
-            app.logger.info(f"df_grouped_ordered criado com {len(df_grouped_ordered)} linhas e {len(df_grouped_ordered.columns)} colunas.")
-        else:
-            app.logger.info("Nenhuma linha qualificada para df_grouped_ordered.")
+        # Reaproveita as posições já traduzidas na atribuição de cores.
+        df_grouped_ordered = df_all_data_with_colors.take(grouped_positions)
+        app.logger.info(f"df_grouped_ordered criado com {len(df_grouped_ordered)} linhas e {len(df_grouped_ordered.columns)} colunas.")
     else:
         app.logger.info("Nenhum grupo encontrado, df_grouped_ordered permanecerá vazio.")
     
     task_id = str(uuid.uuid4())
     cols_to_store = [col for col in df_all_data_with_colors.columns if col not in ['enderecoNormalizado', 'original_index_col']]
-    
-    df_to_store_in_memory = pd.DataFrame(columns=cols_to_store) 
+
+    df_to_store = pd.DataFrame(columns=cols_to_store)
     if not df_grouped_ordered.empty:
-        df_to_store_in_memory = df_grouped_ordered[cols_to_store].copy()
-    
-    app.processed_tasks[task_id] = df_to_store_in_memory
-    
-    app.logger.info(f"Resultados para task_id {task_id} armazenados. Total de itens agrupados: {len(app.processed_tasks[task_id])}.")
+        df_to_store = df_grouped_ordered[cols_to_store].copy()
+
+    if pa is not None:
+        task_path = os.path.join(TASKS_DIR, f'{task_id}.feather')
+        table = pa.Table.from_pandas(df_to_store.reset_index(drop=True), preserve_index=False)
+        # Bairro/Cidade/UF repetem massivamente: dicionarizar (códigos int32 +
+        # valores únicos) encolhe o arquivo e as varreduras posteriores.
+        for field_key in ('Bairro', 'Cidade', 'UF'):
+            actual_col_name = col_mappings.get(field_key)
+            if actual_col_name in table.column_names:
+                i = table.column_names.index(actual_col_name)
+                column = table.column(i)
+                if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+                    table = table.set_column(i, actual_col_name, pc.dictionary_encode(column))
+        # O mapeamento de colunas viaja nos metadados do schema: o download
+        # (mesmo em outro worker) reaproveita em vez de redescobrir.
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'col_mappings'] = json.dumps(col_mappings).encode('utf-8')
+        table = table.replace_schema_metadata(metadata)
+        pa_feather.write_feather(table, task_path, compression='zstd')
+        with _tasks_lock:
+            app.processed_tasks[task_id] = task_path
+        app.logger.info(f"Resultados para task_id {task_id} gravados em {task_path}. Total de itens agrupados: {len(df_to_store)}.")
+    else:
+        with _tasks_lock:
+            app.processed_tasks[task_id] = df_to_store
+        app.logger.info(f"Resultados para task_id {task_id} armazenados em memória. Total de itens agrupados: {len(df_to_store)}.")
 
     preview_data_list = []
-    if not app.processed_tasks[task_id].empty:
+    if not df_to_store.empty:
         app.logger.info("Criando preview_data_list...")
-        preview_data_list = app.processed_tasks[task_id].head(PREVIEW_DATA_ROWS).to_dict(orient='records')
+        # Fatia primeiro, projeta depois: só os campos de saída + groupColor
+        # interessam ao frontend; colunas extras da planilha ficam de fora
+        # do JSON (e o astype(object) roda só sobre 200 x N colunas úteis).
+        preview_cols = [col_mappings[k] for k in OUTPUT_FIELD_ORDER if k in col_mappings]
+        preview_cols.append('groupColor')
+        preview_df = df_to_store.head(PREVIEW_DATA_ROWS)
+        preview_df = preview_df[[c for c in preview_cols if c in preview_df.columns]]
+        preview_df = preview_df.astype(object).where(pd.notna(preview_df), None)
+        preview_data_list = preview_df.to_dict(orient='records')
         app.logger.info(f"preview_data_list criada com {len(preview_data_list)} registros.")
-    
+
     group_colors_present = []
-    if not app.processed_tasks[task_id].empty and 'groupColor' in app.processed_tasks[task_id].columns:
-        group_colors_present = list(app.processed_tasks[task_id]['groupColor'].dropna().unique())
-    
+    if not df_to_store.empty and 'groupColor' in df_to_store.columns:
+        group_colors_present = list(df_to_store['groupColor'].dropna().unique())
+
     app.logger.info("Preparando resposta JSON final...")
     final_response = {
         "task_id": task_id,
         "preview_data": preview_data_list,
-        "total_grouped_items": len(app.processed_tasks[task_id]),
+        "total_grouped_items": len(df_to_store),
         "total_groups": len(groups_indices_list),
         "group_colors_present": group_colors_present
     }
@@ -240,14 +668,16 @@ def analyze_file_endpoint():
 
     try:
         app.logger.info(f"Lendo arquivo: {file.filename}")
-        file_stream = BytesIO(file.read())
-        
+        # file.stream é um SpooledTemporaryFile do werkzeug: lê direto, sem
+        # copiar o upload inteiro para um BytesIO antes do parse.
+        # dtype=str é obrigatório (CEP com zero à esquerda não pode virar
+        # número); com pandas>=3 + pyarrow instalados essas colunas já ficam
+        # em ArrowStringArray, então não usamos dtype_backend='pyarrow', que
+        # reativaria a inferência numérica.
         if file.filename.lower().endswith('.xlsx'):
-            df = pd.read_excel(file_stream, engine='openpyxl', dtype=str, keep_default_na=False, header=1)
-        else: 
-            df = pd.read_excel(file_stream, engine='xlrd', dtype=str, keep_default_na=False, header=1)
-        
-        df.replace({'': None}, inplace=True)
+            df = pd.read_excel(file.stream, engine=_XLSX_ENGINE, dtype=str, keep_default_na=False, header=1)
+        else:
+            df = pd.read_excel(file.stream, engine='xlrd', dtype=str, keep_default_na=False, header=1)
 
         app.logger.info(f"Arquivo lido usando a segunda linha como cabeçalho. Número de linhas de dados: {len(df)}")
         app.logger.info(f"Colunas lidas: {list(df.columns)}") 
@@ -278,53 +708,98 @@ def analyze_file_endpoint():
 @app.route('/api/download_processed/<task_id>', methods=['GET'])
 def download_processed_endpoint(task_id):
     app.logger.info(f"Requisição /api/download_processed/{task_id} recebida.")
-    
-    df_to_download_original = app.processed_tasks.get(task_id)
-    
-    if df_to_download_original is None:
+
+    try:
+        uuid.UUID(task_id)
+    except ValueError:
+        return jsonify({"message": "Identificador de tarefa inválido."}), 404
+
+    export_format = 'csv' if request.args.get('format') == 'csv' else 'xlsx'
+    if export_format == 'csv':
+        mimetype = 'text/csv'
+    else:
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    filename = f'analise-fraude-agrupada-{pd.Timestamp.now().strftime("%Y-%m-%d_%H%M%S")}.{export_format}'
+
+    # Um segundo clique/retry serve os bytes já gerados, sem reprocessar.
+    cached_path = os.path.join(TASKS_DIR, f'{task_id}.{export_format}')
+    if os.path.exists(cached_path):
+        app.logger.info(f"Servindo {export_format} em cache para task_id {task_id}.")
+        return send_file(cached_path, mimetype=mimetype, as_attachment=True, download_name=filename)
+
+    with _tasks_lock:
+        stored = app.processed_tasks.get(task_id)
+
+    if stored is None and pa is not None:
+        # Com múltiplos workers do gunicorn, o analyze pode ter rodado em
+        # outro processo: o arquivo Feather em disco é a fonte de verdade.
+        candidate_path = os.path.join(TASKS_DIR, f'{task_id}.feather')
+        if os.path.exists(candidate_path):
+            stored = candidate_path
+
+    if stored is None or (isinstance(stored, str) and not os.path.exists(stored)):
+        with _tasks_lock:
+            app.processed_tasks.pop(task_id, None)
         app.logger.warning(f"Task_id {task_id} não encontrado em processed_tasks.")
         return jsonify({"message": "Resultados não encontrados ou expirados. Por favor, processe o arquivo novamente."}), 404
 
-    df_to_download = df_to_download_original.copy() 
+    col_mappings_for_download = None
+    if isinstance(stored, str):
+        table = pa_feather.read_table(stored)
+        # Mapeamento persistido junto com os dados no analyze: evita
+        # redescobrir as colunas a cada download.
+        stored_mapping = (table.schema.metadata or {}).get(b'col_mappings')
+        if stored_mapping is not None:
+            col_mappings_for_download = json.loads(stored_mapping)
+        df_to_download = table.to_pandas()
+        # Colunas dicionarizadas voltam como categóricas; objeto simples para
+        # a projeção/fillna do download não esbarrar nas categorias.
+        cat_cols = df_to_download.select_dtypes('category').columns
+        if len(cat_cols):
+            df_to_download[cat_cols] = df_to_download[cat_cols].astype(object)
+    else:
+        # rename/reindex abaixo não mutam o quadro armazenado; sem cópia.
+        df_to_download = stored
 
     try:
         final_output_df = pd.DataFrame(columns=OUTPUT_FIELD_ORDER) 
         
         if not df_to_download.empty:
-            col_mappings_for_download = get_col_mappings_from_df(list(df_to_download.columns))
-            
-            output_data_rows = []
-            for _, row_from_stored_df in df_to_download.iterrows():
-                new_row_for_excel = {}
-                for standard_field_name in OUTPUT_FIELD_ORDER:
-                    actual_col_name_in_df = col_mappings_for_download.get(standard_field_name)
-                    
-                    if actual_col_name_in_df and actual_col_name_in_df in row_from_stored_df and pd.notna(row_from_stored_df[actual_col_name_in_df]):
-                        new_row_for_excel[standard_field_name] = row_from_stored_df[actual_col_name_in_df]
-                    elif standard_field_name in row_from_stored_df and pd.notna(row_from_stored_df[standard_field_name]):
-                        new_row_for_excel[standard_field_name] = row_from_stored_df[standard_field_name]
-                    else:
-                        new_row_for_excel[standard_field_name] = '' 
-                output_data_rows.append(new_row_for_excel)
-            
-            if output_data_rows:
-                final_output_df = pd.DataFrame(output_data_rows, columns=OUTPUT_FIELD_ORDER)
-            
-        app.logger.info(f"Gerando arquivo Excel para task_id {task_id} com {len(final_output_df)} linhas.")
+            if col_mappings_for_download is None:
+                col_mappings_for_download = get_col_mappings_from_df(list(df_to_download.columns))
+            # Renomeia as colunas mapeadas e projeta na ordem de saída de uma
+            # vez, em vez do laço iterrows construindo um dict por linha.
+            inverse_mapping = {actual: standard for standard, actual in col_mappings_for_download.items()}
+            final_output_df = (df_to_download.rename(columns=inverse_mapping)
+                               .reindex(columns=OUTPUT_FIELD_ORDER, fill_value='')
+                               .fillna(''))
+
         output_stream = BytesIO()
-        with pd.ExcelWriter(output_stream, engine='xlsxwriter') as writer:
-            final_output_df.to_excel(writer, index=False, sheet_name='Análise de Endereços Agrupados')
+        if export_format == 'csv':
+            app.logger.info(f"Gerando CSV para task_id {task_id} com {len(final_output_df)} linhas.")
+            final_output_df.to_csv(output_stream, index=False)
+        else:
+            app.logger.info(f"Gerando arquivo Excel para task_id {task_id} com {len(final_output_df)} linhas.")
+            fast_to_xlsx(final_output_df, output_stream, 'Análise de Endereços Agrupados')
         output_stream.seek(0)
-        
-        filename = f'analise-fraude-agrupada-{pd.Timestamp.now().strftime("%Y-%m-%d_%H%M%S")}.xlsx'
-        
-        if task_id in app.processed_tasks:
-            del app.processed_tasks[task_id]
-            app.logger.info(f"Task_id {task_id} removido da memória.")
+
+        # Guarda os bytes gerados ao lado do Feather; a limpeza por TTL
+        # remove ambos quando expirarem.
+        try:
+            with open(cached_path, 'wb') as cache_file:
+                cache_file.write(output_stream.getbuffer())
+        except OSError:
+            pass
+
+        # No modo degradado em memória o quadro não tem TTL: libera o
+        # dicionário já no primeiro download (retries saem do cache acima).
+        if not isinstance(stored, str):
+            with _tasks_lock:
+                app.processed_tasks.pop(task_id, None)
 
         return send_file(
             output_stream,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            mimetype=mimetype,
             as_attachment=True,
             download_name=filename
         )
@@ -338,30 +813,19 @@ def download_processed_endpoint(task_id):
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve_react_app(path):
-    # app.static_folder foi definido na instanciação do Flask
-    if app.static_folder and os.path.exists(app.static_folder):
-        # Se um caminho específico é solicitado e existe (ex: /assets/main.js ou /favicon.ico)
-        path_to_check = os.path.join(app.static_folder, path)
-        if path != "" and os.path.exists(path_to_check):
-            # Medida de segurança simples contra directory traversal
-            if not os.path.abspath(path_to_check).startswith(os.path.abspath(app.static_folder)):
-                app.logger.warning(f"Tentativa de acesso inválido (directory traversal): {path}")
-                return "Caminho inválido", 400
-            app.logger.info(f"Servindo arquivo estático específico: {path}")
+    # send_from_directory já valida o caminho contra directory traversal e
+    # levanta NotFound quando o arquivo não existe, então basta tentar servir
+    # o arquivo pedido e cair no index.html (roteamento do lado do React).
+    try:
+        if path:
             return send_from_directory(app.static_folder, path)
-        else:
-            # Para a rota raiz ou qualquer outra rota não API que não corresponda a um arquivo, servir index.html
-            index_html_path = os.path.join(app.static_folder, 'index.html')
-            if os.path.exists(index_html_path):
-                app.logger.info(f"Servindo index.html para o path: '{path}'")
-                return send_from_directory(app.static_folder, 'index.html')
-            else:
-                app.logger.error(f"ERRO CRÍTICO: index.html não encontrado em {app.static_folder} ao tentar servir para path: '{path}'")
-                return "Arquivo index.html principal não encontrado.", 404
-    else:
-        # Fallback se a pasta estática não estiver configurada ou não existir
-        app.logger.warning(f"Tentativa de servir frontend, mas static_folder não está configurado ou não existe: '{app.static_folder}'")
-        return "Interface do usuário não está disponível (static_folder não encontrado).", 404
+        return send_from_directory(app.static_folder, 'index.html')
+    except NotFound:
+        try:
+            return send_from_directory(app.static_folder, 'index.html')
+        except NotFound:
+            app.logger.error(f"index.html não encontrado em {app.static_folder} ao servir path: '{path}'")
+            return "Arquivo index.html principal não encontrado.", 404
 
 
 if __name__ == '__main__':
@@ -0,0 +1,11 @@
+import multiprocessing
+import os
+
+# Servidor WSGI para produção: o app.run() do Flask atende uma requisição
+# por vez; com gthread, vários uploads podem ser analisados em paralelo.
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = 2 * multiprocessing.cpu_count() + 1
+worker_class = 'gthread'
+threads = 4
+timeout = 300
+accesslog = '-'